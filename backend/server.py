@@ -1,14 +1,19 @@
 from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File
+from fastapi.responses import FileResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DocumentTooLarge
 import os
+import json
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 
 
@@ -20,6 +25,15 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Jobs em segundo plano
+JOBS_MAX_CONCORRENCIA = int(os.environ.get('JOBS_MAX_CONCORRENCIA', '2'))
+JOBS_TAMANHO_LOTE = int(os.environ.get('JOBS_TAMANHO_LOTE', '50'))
+JOBS_LEASE_SEGUNDOS = int(os.environ.get('JOBS_LEASE_SEGUNDOS', '120'))
+JOBS_MAX_TENTATIVAS = int(os.environ.get('JOBS_MAX_TENTATIVAS', '3'))
+JOBS_MAX_ERROS_REPORTADOS = int(os.environ.get('JOBS_MAX_ERROS_REPORTADOS', '100'))
+JOBS_PROCESSO_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', ROOT_DIR / 'exports'))
+
 # Create the main app without a prefix
 app = FastAPI(title="Sistema de Propostas API", version="1.0.0")
 
@@ -44,6 +58,18 @@ class StatusProposta(str, Enum):
     APROVADA = "aprovada"
     REJEITADA = "rejeitada"
 
+class StatusJob(str, Enum):
+    PENDENTE = "pendente"
+    EXECUTANDO = "executando"
+    CONCLUIDO = "concluido"
+    FALHOU = "falhou"
+    CANCELADO = "cancelado"
+
+class TipoJob(str, Enum):
+    REPRECIFICAR_PROPOSTAS = "reprecificar_propostas"
+    EXPORTAR_PROPOSTAS = "exportar_propostas"
+    IMPORTAR_SERVICOS = "importar_servicos"
+
 
 # Models
 class Servico(BaseModel):
@@ -204,6 +230,46 @@ class PropostaUpdate(BaseModel):
     status: Optional[StatusProposta] = None
 
 
+class JobStatus(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    tipo: TipoJob
+    status: StatusJob = StatusJob.PENDENTE
+    
+    # Progresso
+    total: int = 0
+    processados: int = 0
+    progresso: float = 0.0  # percentual de 0 a 100
+    checkpoint: Optional[str] = None  # ponto de retomada após reinício do servidor
+    
+    resultado: Dict[str, Any] = Field(default_factory=dict)
+    erro: Optional[str] = None
+    cancelamento_solicitado: bool = False
+    tentativas: int = 0
+    dono: Optional[str] = None  # processo que detém o lease do job em execução
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    iniciado_em: Optional[datetime] = None
+    finalizado_em: Optional[datetime] = None
+
+class Job(JobStatus):
+    parametros: Dict[str, Any] = Field(default_factory=dict)
+
+class JobCreate(BaseModel):
+    tipo: TipoJob
+    parametros: Optional[Dict[str, Any]] = None
+
+class ParametrosPropostasJob(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    
+    status: Optional[StatusProposta] = None
+
+class ParametrosImportacaoJob(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    
+    servicos: List[Any]  # itens inválidos são reportados individualmente no resultado do job
+
+
 # Helper Functions
 def calcular_proposta(itens_data: List[Dict[str, Any]], configuracoes: Configuracoes, 
                      deslocamento_km: float = 0.0, horas_plantao: float = 0.0,
@@ -280,6 +346,18 @@ async def get_configuracoes() -> Configuracoes:
         return config_default
     return Configuracoes(**config)
 
+def calcular_valor_unitario(servico: Dict[str, Any], tipo_atendimento: str) -> float:
+    """Determina o valor unitário do serviço baseado no tipo de atendimento"""
+    if servico["tipo_cobranca"] == "remoto" and tipo_atendimento == "remoto":
+        return servico["valor_remoto"]
+    elif servico["tipo_cobranca"] == "presencial" and tipo_atendimento == "presencial":
+        return servico["valor_presencial"]
+    elif servico["tipo_cobranca"] == "fixo":
+        return servico["valor_fixo"]
+    elif servico["tipo_cobranca"] == "projeto":
+        return servico["valor_base_projeto"]
+    return 0.0
+
 def gerar_numero_proposta() -> str:
     """Gera número sequencial para proposta"""
     import time
@@ -287,6 +365,360 @@ def gerar_numero_proposta() -> str:
     return f"PROP-{timestamp}"
 
 
+# ================================
+# JOBS EM SEGUNDO PLANO
+# ================================
+# Operações pesadas (reprecificação, exportação, importação de catálogo) rodam
+# em um pool limitado de workers no mesmo event loop da API. Os handlers
+# processam em lotes e cedem o loop a cada item, para que os endpoints
+# interativos mantenham a latência enquanto os jobs executam.
+#
+# Um job em execução pertence ao processo que o assumiu (campo "dono") enquanto
+# seu updated_at for renovado a cada lote. Jobs cujo lease expira são devolvidos
+# à fila por qualquer processo, até o limite de JOBS_MAX_TENTATIVAS.
+
+class JobCancelado(Exception):
+    """Sinaliza que o cancelamento do job foi solicitado"""
+
+class JobPerdido(Exception):
+    """Sinaliza que o lease do job expirou e ele foi assumido por outro processo"""
+
+fila_jobs: Optional[asyncio.Queue] = None
+jobs_enfileirados: set = set()
+tarefas_jobs: List[asyncio.Task] = []
+
+def enfileirar_job(job_id: str):
+    """Coloca o job na fila local, evitando duplicatas"""
+    if job_id not in jobs_enfileirados:
+        jobs_enfileirados.add(job_id)
+        fila_jobs.put_nowait(job_id)
+
+async def reportar_progresso_job(job_id: str, processados: int, total: int,
+                                 checkpoint: Optional[str] = None,
+                                 resultado: Optional[Dict[str, Any]] = None):
+    """Persiste o progresso e renova o lease do job, interrompendo a execução se o
+    cancelamento foi solicitado ou se o job não pertence mais a este processo"""
+    update_data = {
+        "processados": processados,
+        "total": total,
+        "progresso": round(processados / total * 100, 2) if total else 100.0,
+        "updated_at": datetime.utcnow()
+    }
+    if checkpoint is not None:
+        update_data["checkpoint"] = checkpoint
+    if resultado is not None:
+        update_data["resultado"] = resultado
+    
+    job = await db.jobs.find_one_and_update(
+        {"id": job_id, "status": StatusJob.EXECUTANDO, "dono": JOBS_PROCESSO_ID},
+        {"$set": update_data}
+    )
+    if not job:
+        raise JobPerdido()
+    if job.get("cancelamento_solicitado"):
+        raise JobCancelado()
+
+def filtros_propostas_job(parametros: Dict[str, Any]) -> Dict[str, Any]:
+    """Monta os filtros de propostas a partir dos parâmetros validados do job"""
+    parametros_job = ParametrosPropostasJob(**parametros)
+    filtros = {}
+    if parametros_job.status:
+        filtros["status"] = parametros_job.status
+    return filtros
+
+async def job_reprecificar_propostas(job: Job) -> Dict[str, Any]:
+    """Recalcula itens e totais das propostas com o catálogo e as configurações atuais.
+    
+    Sem o parâmetro ``status`` apenas propostas em rascunho são reprecificadas, para não
+    alterar valores já enviados ou aprovados pelo cliente; outros status precisam ser
+    informados explicitamente. Propostas editadas durante o job não são sobrescritas.
+    
+    Os contadores do resultado só avançam junto com o checkpoint: ao retomar, o lote
+    interrompido é reprocessado por completo e cada proposta é contada uma única vez.
+    """
+    configuracoes = await get_configuracoes()
+    filtros = filtros_propostas_job(job.parametros)
+    filtros.setdefault("status", StatusProposta.RASCUNHO)
+    total = await db.propostas.count_documents(filtros)
+    
+    # Retoma a partir do último lote concluído
+    processados = job.processados
+    checkpoint = job.checkpoint
+    resultado = {"atualizadas": 0, "ignoradas": 0, **job.resultado}
+    
+    while True:
+        filtros_lote = dict(filtros)
+        if checkpoint:
+            filtros_lote["id"] = {"$gt": checkpoint}
+        lote = await db.propostas.find(filtros_lote).sort("id", 1).limit(JOBS_TAMANHO_LOTE).to_list(JOBS_TAMANHO_LOTE)
+        if not lote:
+            break
+        
+        servico_ids = list({item["servico_id"] for proposta in lote for item in proposta.get("itens", [])})
+        servicos = await db.servicos.find({"id": {"$in": servico_ids}}).to_list(None)
+        servicos_por_id = {servico["id"]: servico for servico in servicos}
+        
+        atualizadas_lote = 0
+        ignoradas_lote = 0
+        for proposta in lote:
+            itens = proposta.get("itens", [])
+            for item in itens:
+                servico = servicos_por_id.get(item["servico_id"])
+                if not servico:
+                    continue
+                item["valor_unitario"] = calcular_valor_unitario(servico, item.get("tipo_atendimento", "remoto"))
+                item["subtotal"] = item.get("quantidade", 1) * item["valor_unitario"]
+            
+            calculos = calcular_proposta(
+                itens,
+                configuracoes,
+                proposta.get("deslocamento_km", 0.0),
+                proposta.get("horas_plantao", 0.0),
+                proposta.get("urgencia_global", False),
+                proposta.get("desconto_tipo", "fixo"),
+                proposta.get("desconto_valor", 0.0)
+            )
+            
+            update_data = {"itens": itens, **calculos}
+            update_data["updated_at"] = datetime.utcnow()
+            # Só grava se a proposta não mudou desde a leitura do lote; uma edição feita
+            # pelo usuário nesse intervalo prevalece e a proposta é ignorada
+            result = await db.propostas.update_one(
+                {"id": proposta["id"], "updated_at": proposta.get("updated_at")},
+                {"$set": update_data}
+            )
+            if result.matched_count:
+                atualizadas_lote += 1
+            else:
+                ignoradas_lote += 1
+            await asyncio.sleep(0)
+        
+        resultado["atualizadas"] += atualizadas_lote
+        resultado["ignoradas"] += ignoradas_lote
+        processados += len(lote)
+        checkpoint = lote[-1]["id"]
+        await reportar_progresso_job(job.id, processados, max(total, processados), checkpoint, resultado)
+    
+    return resultado
+
+def anexar_linhas_arquivo(caminho: Path, linhas: List[str]):
+    """Anexa linhas a um arquivo (executado fora do event loop)"""
+    with open(caminho, "a", encoding="utf-8") as arquivo:
+        arquivo.writelines(linhas)
+
+async def job_exportar_propostas(job: Job) -> Dict[str, Any]:
+    """Exporta as propostas para um arquivo JSON Lines"""
+    filtros = filtros_propostas_job(job.parametros)
+    total = await db.propostas.count_documents(filtros)
+    
+    caminho = EXPORT_DIR / f"propostas-{job.id}.jsonl"
+    temporario = caminho.with_suffix(".tmp")
+    
+    # A exportação sempre recomeça do início: o arquivo parcial de uma execução interrompida é descartado
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    temporario.unlink(missing_ok=True)
+    
+    processados = 0
+    ultimo_id = None
+    try:
+        while True:
+            filtros_lote = dict(filtros)
+            if ultimo_id:
+                filtros_lote["id"] = {"$gt": ultimo_id}
+            lote = await db.propostas.find(filtros_lote).sort("id", 1).limit(JOBS_TAMANHO_LOTE).to_list(JOBS_TAMANHO_LOTE)
+            if not lote:
+                break
+            
+            linhas = [json.dumps(Proposta(**proposta).dict(), default=str, ensure_ascii=False) + "\n" for proposta in lote]
+            await asyncio.to_thread(anexar_linhas_arquivo, temporario, linhas)
+            
+            processados += len(lote)
+            ultimo_id = lote[-1]["id"]
+            await reportar_progresso_job(job.id, processados, max(total, processados))
+        
+        if processados == 0:
+            temporario.touch()
+        await asyncio.to_thread(os.replace, temporario, caminho)
+    finally:
+        # Cancelamento ou falha não deixam arquivos parciais para trás
+        temporario.unlink(missing_ok=True)
+    return {"arquivo": caminho.name, "total_exportado": processados}
+
+async def salvar_itens_job(job_id: str, itens: List[Any]):
+    """Grava os itens de entrada do job em lotes na coleção jobs_itens"""
+    lotes = [
+        {"job_id": job_id, "inicio": inicio, "itens": itens[inicio:inicio + JOBS_TAMANHO_LOTE]}
+        for inicio in range(0, len(itens), JOBS_TAMANHO_LOTE)
+    ]
+    if lotes:
+        await db.jobs_itens.insert_many(lotes)
+
+async def descartar_itens_job(job_ids: List[str]):
+    """Remove os itens de entrada de jobs finalizados"""
+    await db.jobs_itens.delete_many({"job_id": {"$in": job_ids}})
+
+async def job_importar_servicos(job: Job) -> Dict[str, Any]:
+    """Importa serviços para o catálogo, atualizando os que já existem com mesmo nome e categoria.
+    
+    Os serviços ficam em lotes na coleção jobs_itens; o checkpoint é o índice do próximo item.
+    Apenas os primeiros JOBS_MAX_ERROS_REPORTADOS erros são detalhados no resultado.
+    """
+    total = job.total
+    
+    # Retoma a partir do último lote concluído
+    inicio = int(job.checkpoint) if job.checkpoint else 0
+    resultado = {"criados": 0, "atualizados": 0, "total_erros": 0, "erros": [], **job.resultado}
+    
+    while True:
+        lote_doc = await db.jobs_itens.find_one({"job_id": job.id, "inicio": {"$gte": inicio}}, sort=[("inicio", 1)])
+        if not lote_doc:
+            break
+        
+        lote = lote_doc["itens"]
+        for indice, servico_data in enumerate(lote, start=lote_doc["inicio"]):
+            try:
+                servico = ServicoCreate(**servico_data)
+            except (ValidationError, TypeError) as e:
+                resultado["total_erros"] += 1
+                if len(resultado["erros"]) < JOBS_MAX_ERROS_REPORTADOS:
+                    resultado["erros"].append({"indice": indice, "erro": str(e)})
+                continue
+            
+            servico_existente = await db.servicos.find_one({"nome": servico.nome, "categoria": servico.categoria})
+            if servico_existente:
+                update_data = servico.dict()
+                update_data["updated_at"] = datetime.utcnow()
+                await db.servicos.update_one({"id": servico_existente["id"]}, {"$set": update_data})
+                resultado["atualizados"] += 1
+            else:
+                servico_obj = Servico(**servico.dict())
+                await db.servicos.insert_one(servico_obj.dict())
+                resultado["criados"] += 1
+            await asyncio.sleep(0)
+        
+        inicio = lote_doc["inicio"] + len(lote)
+        await reportar_progresso_job(job.id, inicio, total, str(inicio), resultado)
+    
+    return resultado
+
+PARAMETROS_JOBS = {
+    TipoJob.REPRECIFICAR_PROPOSTAS: ParametrosPropostasJob,
+    TipoJob.EXPORTAR_PROPOSTAS: ParametrosPropostasJob,
+    TipoJob.IMPORTAR_SERVICOS: ParametrosImportacaoJob,
+}
+
+HANDLERS_JOBS = {
+    TipoJob.REPRECIFICAR_PROPOSTAS: job_reprecificar_propostas,
+    TipoJob.EXPORTAR_PROPOSTAS: job_exportar_propostas,
+    TipoJob.IMPORTAR_SERVICOS: job_importar_servicos,
+}
+
+async def finalizar_job(job_id: str, status: StatusJob,
+                        filtros_extras: Optional[Dict[str, Any]] = None, **campos) -> bool:
+    """Marca o job como finalizado com o status informado, se ainda pertencer a este processo"""
+    agora = datetime.utcnow()
+    update_data = {"status": status, "finalizado_em": agora, "updated_at": agora, **campos}
+    filtros = {"id": job_id, "status": StatusJob.EXECUTANDO, "dono": JOBS_PROCESSO_ID, **(filtros_extras or {})}
+    result = await db.jobs.update_one(filtros, {"$set": update_data})
+    if result.matched_count == 0:
+        return False
+    await descartar_itens_job([job_id])
+    return True
+
+async def executar_job(job_id: str):
+    """Executa um job pendente, garantindo que apenas um worker o assuma"""
+    agora = datetime.utcnow()
+    job_doc = await db.jobs.find_one_and_update(
+        {"id": job_id, "status": StatusJob.PENDENTE},
+        {"$set": {"status": StatusJob.EXECUTANDO, "dono": JOBS_PROCESSO_ID,
+                  "iniciado_em": agora, "updated_at": agora},
+         "$inc": {"tentativas": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job_doc:
+        # Job cancelado antes de iniciar ou já assumido por outro worker
+        return
+    
+    job = Job(**job_doc)
+    try:
+        if job.cancelamento_solicitado:
+            raise JobCancelado()
+        resultado = await HANDLERS_JOBS[job.tipo](job)
+    except JobCancelado:
+        await finalizar_job(job.id, StatusJob.CANCELADO)
+    except JobPerdido:
+        logger.warning(f"Job {job.id} ({job.tipo}) foi assumido por outro processo após expirar o lease")
+    except asyncio.CancelledError:
+        # Servidor encerrando: o job é devolvido à fila em parar_workers_jobs
+        raise
+    except Exception as e:
+        logger.exception(f"Job {job.id} ({job.tipo}) falhou")
+        await finalizar_job(job.id, StatusJob.FALHOU, erro=str(e))
+    else:
+        # Um cancelamento pedido depois do último lote só prevalece sobre a conclusão quando
+        # o resultado pode ser descartado; reprecificação e importação já gravaram os dados
+        filtros_extras = None
+        if job.tipo == TipoJob.EXPORTAR_PROPOSTAS:
+            filtros_extras = {"cancelamento_solicitado": {"$ne": True}}
+        concluido = await finalizar_job(
+            job.id, StatusJob.CONCLUIDO, filtros_extras,
+            resultado=resultado, progresso=100.0
+        )
+        if not concluido and filtros_extras and await finalizar_job(job.id, StatusJob.CANCELADO):
+            (EXPORT_DIR / resultado["arquivo"]).unlink(missing_ok=True)
+
+async def recuperar_jobs():
+    """Devolve à fila os jobs com lease expirado e enfileira os pendentes"""
+    agora = datetime.utcnow()
+    expirados = {
+        "status": StatusJob.EXECUTANDO,
+        "updated_at": {"$lt": agora - timedelta(seconds=JOBS_LEASE_SEGUNDOS)}
+    }
+    
+    # Jobs que já interromperam o processo repetidas vezes não são retomados
+    esgotados = await db.jobs.find(
+        {**expirados, "tentativas": {"$gte": JOBS_MAX_TENTATIVAS}}, {"id": 1}
+    ).to_list(None)
+    if esgotados:
+        esgotados_ids = [job["id"] for job in esgotados]
+        await db.jobs.update_many(
+            {**expirados, "id": {"$in": esgotados_ids}},
+            {"$set": {"status": StatusJob.FALHOU, "erro": "Número máximo de tentativas excedido",
+                      "finalizado_em": agora, "updated_at": agora}}
+        )
+        await descartar_itens_job(esgotados_ids)
+    # Os demais retomam do último checkpoint
+    await db.jobs.update_many(
+        expirados,
+        {"$set": {"status": StatusJob.PENDENTE, "dono": None, "updated_at": agora}}
+    )
+    
+    pendentes = await db.jobs.find({"status": StatusJob.PENDENTE}, {"id": 1}).sort("created_at", 1).to_list(None)
+    for job in pendentes:
+        enfileirar_job(job["id"])
+
+async def monitorar_jobs():
+    """Recupera periodicamente jobs de processos que pararam de renovar o lease"""
+    while True:
+        await asyncio.sleep(JOBS_LEASE_SEGUNDOS / 2)
+        try:
+            await recuperar_jobs()
+        except Exception:
+            logger.exception("Erro ao recuperar jobs")
+
+async def worker_jobs(fila: asyncio.Queue):
+    """Consome a fila de jobs indefinidamente"""
+    while True:
+        job_id = await fila.get()
+        jobs_enfileirados.discard(job_id)
+        try:
+            await executar_job(job_id)
+        except Exception:
+            logger.exception(f"Erro ao executar job {job_id}")
+        finally:
+            fila.task_done()
+
+
 # ================================
 # ROUTES - SERVIÇOS
 # ================================
@@ -456,16 +888,7 @@ async def criar_proposta(proposta: PropostaCreate):
         
         # Determina valor unitário baseado no tipo de atendimento
         tipo_atendimento = item_data.get("tipo_atendimento", "remoto")
-        valor_unitario = 0.0
-        
-        if servico["tipo_cobranca"] == "remoto" and tipo_atendimento == "remoto":
-            valor_unitario = servico["valor_remoto"]
-        elif servico["tipo_cobranca"] == "presencial" and tipo_atendimento == "presencial":
-            valor_unitario = servico["valor_presencial"]
-        elif servico["tipo_cobranca"] == "fixo":
-            valor_unitario = servico["valor_fixo"]
-        elif servico["tipo_cobranca"] == "projeto":
-            valor_unitario = servico["valor_base_projeto"]
+        valor_unitario = calcular_valor_unitario(servico, tipo_atendimento)
         
         quantidade = item_data.get("quantidade", 1)
         subtotal = quantidade * valor_unitario
@@ -614,6 +1037,100 @@ async def calcular_preview_proposta(dados: Dict[str, Any]):
     return calculos
 
 
+# ================================
+# ROUTES - JOBS
+# ================================
+
+@api_router.post("/jobs", response_model=JobStatus, status_code=202)
+async def criar_job(job: JobCreate):
+    """Enfileira um job para execução em segundo plano"""
+    try:
+        parametros = PARAMETROS_JOBS[job.tipo](**(job.parametros or {}))
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.errors(include_url=False))
+    
+    # Os serviços a importar ficam fora do documento do job, que tem limite de 16 MB no Mongo
+    job_obj = Job(tipo=job.tipo, parametros=parametros.dict(exclude_none=True, exclude={"servicos"}))
+    if job.tipo == TipoJob.IMPORTAR_SERVICOS:
+        job_obj.total = len(parametros.servicos)
+        try:
+            await salvar_itens_job(job_obj.id, parametros.servicos)
+        except DocumentTooLarge:
+            await descartar_itens_job([job_obj.id])
+            raise HTTPException(status_code=400, detail="Serviços a importar excedem o tamanho máximo por lote")
+    
+    await db.jobs.insert_one(job_obj.dict())
+    enfileirar_job(job_obj.id)
+    return job_obj
+
+@api_router.get("/jobs", response_model=List[JobStatus])
+async def listar_jobs(
+    status: Optional[StatusJob] = None,
+    tipo: Optional[TipoJob] = None,
+    limit: int = 50,
+    skip: int = 0
+):
+    """Lista jobs com filtros"""
+    filtros = {}
+    if status:
+        filtros["status"] = status
+    if tipo:
+        filtros["tipo"] = tipo
+    
+    jobs = await db.jobs.find(filtros, {"parametros": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    return [JobStatus(**job) for job in jobs]
+
+@api_router.get("/jobs/{job_id}", response_model=JobStatus)
+async def buscar_job(job_id: str):
+    """Busca um job por ID para acompanhar status e progresso"""
+    job = await db.jobs.find_one({"id": job_id}, {"parametros": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return JobStatus(**job)
+
+@api_router.post("/jobs/{job_id}/cancelar", response_model=JobStatus)
+async def cancelar_job(job_id: str):
+    """Solicita o cancelamento de um job pendente ou em execução"""
+    job = await db.jobs.find_one({"id": job_id}, {"parametros": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if job["status"] not in (StatusJob.PENDENTE, StatusJob.EXECUTANDO):
+        raise HTTPException(status_code=400, detail="Job já finalizado")
+    
+    agora = datetime.utcnow()
+    # Job ainda na fila é cancelado imediatamente; em execução, o worker interrompe no próximo lote
+    result = await db.jobs.update_one(
+        {"id": job_id, "status": StatusJob.PENDENTE},
+        {"$set": {"status": StatusJob.CANCELADO, "cancelamento_solicitado": True,
+                  "finalizado_em": agora, "updated_at": agora}}
+    )
+    if result.matched_count:
+        await descartar_itens_job([job_id])
+    else:
+        # updated_at é o lease do dono do job e não pode ser renovado por este pedido
+        await db.jobs.update_one(
+            {"id": job_id, "status": StatusJob.EXECUTANDO},
+            {"$set": {"cancelamento_solicitado": True}}
+        )
+    
+    job_atualizado = await db.jobs.find_one({"id": job_id}, {"parametros": 0})
+    return JobStatus(**job_atualizado)
+
+@api_router.get("/jobs/{job_id}/arquivo")
+async def baixar_arquivo_job(job_id: str):
+    """Baixa o arquivo gerado por um job de exportação concluído"""
+    job = await db.jobs.find_one({"id": job_id}, {"parametros": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if job["tipo"] != TipoJob.EXPORTAR_PROPOSTAS or job["status"] != StatusJob.CONCLUIDO:
+        raise HTTPException(status_code=400, detail="Job não possui arquivo disponível")
+    
+    caminho = EXPORT_DIR / job["resultado"]["arquivo"]
+    if not caminho.exists():
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    return FileResponse(caminho, media_type="application/x-ndjson", filename=caminho.name)
+
+
 # ================================
 # ROUTES - UTILITÁRIOS
 # ================================
@@ -652,6 +1169,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def iniciar_workers_jobs():
+    """Retoma jobs interrompidos e inicia o pool de workers"""
+    global fila_jobs
+    fila_jobs = asyncio.Queue()
+    jobs_enfileirados.clear()
+    
+    await recuperar_jobs()
+    
+    for _ in range(JOBS_MAX_CONCORRENCIA):
+        tarefas_jobs.append(asyncio.create_task(worker_jobs(fila_jobs)))
+    tarefas_jobs.append(asyncio.create_task(monitorar_jobs()))
+
+@app.on_event("shutdown")
+async def parar_workers_jobs():
+    """Interrompe os workers e libera os jobs em andamento para serem retomados"""
+    for tarefa in tarefas_jobs:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas_jobs, return_exceptions=True)
+    tarefas_jobs.clear()
+    
+    # Encerramento normal não conta como tentativa
+    await db.jobs.update_many(
+        {"status": StatusJob.EXECUTANDO, "dono": JOBS_PROCESSO_ID},
+        {"$set": {"status": StatusJob.PENDENTE, "dono": None, "updated_at": datetime.utcnow()},
+         "$inc": {"tentativas": -1}}
+    )
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
@@ -0,0 +1,35 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    """Banco em memória, diretório de exportação temporário e fila de jobs isolada"""
+    banco = AsyncMongoMockClient()["test_database"]
+    monkeypatch.setattr(server, "db", banco)
+    monkeypatch.setattr(server, "EXPORT_DIR", tmp_path / "exports")
+    monkeypatch.setattr(server, "JOBS_TAMANHO_LOTE", 2)
+    monkeypatch.setattr(server, "fila_jobs", asyncio.Queue())
+    monkeypatch.setattr(server, "jobs_enfileirados", set())
+    return banco
+
+
+@pytest.fixture
+async def client(db):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
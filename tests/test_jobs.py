@@ -0,0 +1,413 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+from server import (
+    ItemProposta,
+    Job,
+    Proposta,
+    Servico,
+    StatusJob,
+    StatusProposta,
+    TipoCobranca,
+    TipoJob,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def criar_servico(db, nome="Suporte", valor_fixo=10.0):
+    servico = Servico(nome=nome, categoria="TI", tipo_cobranca=TipoCobranca.FIXO, valor_fixo=valor_fixo)
+    await db.servicos.insert_one(servico.dict())
+    return servico
+
+
+async def criar_propostas(db, servico, quantidade, status=StatusProposta.RASCUNHO):
+    for i in range(quantidade):
+        item = ItemProposta(
+            servico_id=servico.id,
+            servico_nome=servico.nome,
+            servico_categoria=servico.categoria,
+            tipo_atendimento="remoto",
+            quantidade=1,
+            valor_unitario=servico.valor_fixo,
+            subtotal=servico.valor_fixo,
+        )
+        proposta = Proposta(
+            id=f"p{i:02d}",
+            numero=f"PROP-{i}",
+            cliente_nome=f"Cliente {i}",
+            itens=[item],
+            subtotal_servicos=servico.valor_fixo,
+            valor_total=servico.valor_fixo,
+            status=status,
+            updated_at=datetime.utcnow() - timedelta(minutes=1),
+        )
+        await db.propostas.insert_one(proposta.dict())
+
+
+async def valores_totais(db):
+    propostas = await db.propostas.find().sort("id", 1).to_list(None)
+    return [proposta["valor_total"] for proposta in propostas]
+
+
+async def enfileirar(client, tipo, parametros=None):
+    response = await client.post("/api/jobs", json={"tipo": tipo, "parametros": parametros})
+    assert response.status_code == 202, response.text
+    return response.json()["id"]
+
+
+async def buscar_job(db, job_id):
+    return Job(**await db.jobs.find_one({"id": job_id}))
+
+
+# Validação de parâmetros
+
+@pytest.mark.parametrize("parametros", [
+    {"status": {"$ne": "zzz"}},
+    {"status": "zzz"},
+    {"campo_desconhecido": 1},
+])
+async def test_rejeita_parametro_status_invalido(client, db, parametros):
+    response = await client.post("/api/jobs", json={"tipo": "reprecificar_propostas", "parametros": parametros})
+    assert response.status_code == 400
+    assert await db.jobs.count_documents({}) == 0
+
+
+@pytest.mark.parametrize("parametros", [None, {"servicos": "catalogo"}, {"servicos": {"nome": "x"}}])
+async def test_rejeita_parametro_servicos_invalido(client, db, parametros):
+    response = await client.post("/api/jobs", json={"tipo": "importar_servicos", "parametros": parametros})
+    assert response.status_code == 400
+    assert await db.jobs.count_documents({}) == 0
+
+
+async def test_status_do_job_nao_inclui_parametros(client, db):
+    servicos = [{"nome": f"S{i}", "categoria": "TI", "tipo_cobranca": "fixo"} for i in range(3)]
+    response = await client.post("/api/jobs", json={"tipo": "importar_servicos", "parametros": {"servicos": servicos}})
+    job_id = response.json()["id"]
+
+    assert "parametros" not in response.json()
+    assert "parametros" not in (await client.get(f"/api/jobs/{job_id}")).json()
+    assert "parametros" not in (await client.get("/api/jobs")).json()[0]
+
+
+async def test_importacao_guarda_servicos_fora_do_documento_do_job(client, db):
+    servicos = [{"nome": f"S{i}", "categoria": "TI", "tipo_cobranca": "fixo"} for i in range(5)]
+    job_id = await enfileirar(client, "importar_servicos", {"servicos": servicos})
+
+    assert (await db.jobs.find_one({"id": job_id}))["parametros"] == {}
+    lotes = await db.jobs_itens.find({"job_id": job_id}).sort("inicio", 1).to_list(None)
+    assert [lote["inicio"] for lote in lotes] == [0, 2, 4]
+    assert [item for lote in lotes for item in lote["itens"]] == servicos
+
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CONCLUIDO
+    assert job.resultado["criados"] == 5
+    assert await db.jobs_itens.count_documents({"job_id": job_id}) == 0
+
+
+async def test_importacao_retoma_do_checkpoint(client, db):
+    servicos = [{"nome": f"S{i}", "categoria": "TI", "tipo_cobranca": "fixo"} for i in range(5)]
+    job_id = await enfileirar(client, "importar_servicos", {"servicos": servicos})
+    await db.jobs.update_one({"id": job_id}, {"$set": {"checkpoint": "2", "processados": 2}})
+
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.processados == 5
+    assert sorted(servico["nome"] for servico in await db.servicos.find().to_list(None)) == ["S2", "S3", "S4"]
+
+
+# Importação de serviços
+
+async def test_importacao_atualiza_existentes_e_reporta_erros_por_item(client, db):
+    existente = await criar_servico(db, nome="Suporte", valor_fixo=10.0)
+    servicos = [
+        {"nome": "Suporte", "categoria": "TI", "tipo_cobranca": "fixo", "valor_fixo": 15.0},
+        {"nome": "Backup", "categoria": "TI", "tipo_cobranca": "fixo", "valor_fixo": 30.0},
+        {"nome": "Sem categoria"},
+        "invalido",
+    ]
+    job_id = await enfileirar(client, "importar_servicos", {"servicos": servicos})
+
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CONCLUIDO
+    assert job.processados == job.total == 4
+    assert job.resultado["criados"] == 1
+    assert job.resultado["atualizados"] == 1
+    assert job.resultado["total_erros"] == 2
+    assert [erro["indice"] for erro in job.resultado["erros"]] == [2, 3]
+    assert (await db.servicos.find_one({"id": existente.id}))["valor_fixo"] == 15.0
+    assert await db.servicos.count_documents({}) == 2
+
+
+# Exportação de propostas
+
+async def test_exportacao_gera_arquivo_com_as_propostas(client, db):
+    servico = await criar_servico(db)
+    await criar_propostas(db, servico, 3)
+    job_id = await enfileirar(client, "exportar_propostas")
+
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CONCLUIDO
+    assert job.resultado["total_exportado"] == 3
+
+    caminho = server.EXPORT_DIR / job.resultado["arquivo"]
+    linhas = [json.loads(linha) for linha in caminho.read_text(encoding="utf-8").splitlines()]
+    assert [linha["id"] for linha in linhas] == ["p00", "p01", "p02"]
+    assert linhas[0]["cliente_nome"] == "Cliente 0"
+    assert linhas[0]["itens"][0]["servico_id"] == servico.id
+    assert list(server.EXPORT_DIR.glob("*.tmp")) == []
+
+    response = await client.get(f"/api/jobs/{job_id}/arquivo")
+    assert response.status_code == 200
+    assert response.text == caminho.read_text(encoding="utf-8")
+
+
+async def test_cancelamento_apos_ultimo_lote_descarta_exportacao(client, db, monkeypatch):
+    servico = await criar_servico(db)
+    await criar_propostas(db, servico, 3)
+    job_id = await enfileirar(client, "exportar_propostas")
+
+    handler_original = server.HANDLERS_JOBS[TipoJob.EXPORTAR_PROPOSTAS]
+
+    async def exportar_e_cancelar(job):
+        resultado = await handler_original(job)
+        await client.post(f"/api/jobs/{job_id}/cancelar")
+        return resultado
+
+    monkeypatch.setitem(server.HANDLERS_JOBS, TipoJob.EXPORTAR_PROPOSTAS, exportar_e_cancelar)
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CANCELADO
+    assert list(server.EXPORT_DIR.iterdir()) == []
+
+
+async def test_cancelamento_apos_ultimo_lote_nao_desfaz_reprecificacao(client, db, monkeypatch):
+    servico = await criar_servico(db, valor_fixo=10.0)
+    await criar_propostas(db, servico, 3)
+    await db.servicos.update_one({"id": servico.id}, {"$set": {"valor_fixo": 20.0}})
+    job_id = await enfileirar(client, "reprecificar_propostas")
+
+    handler_original = server.HANDLERS_JOBS[TipoJob.REPRECIFICAR_PROPOSTAS]
+
+    async def reprecificar_e_cancelar(job):
+        resultado = await handler_original(job)
+        await client.post(f"/api/jobs/{job_id}/cancelar")
+        return resultado
+
+    monkeypatch.setitem(server.HANDLERS_JOBS, TipoJob.REPRECIFICAR_PROPOSTAS, reprecificar_e_cancelar)
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CONCLUIDO
+    assert job.resultado["atualizadas"] == 3
+    assert await valores_totais(db) == [20.0, 20.0, 20.0]
+
+
+# Cancelamento
+
+async def test_cancelar_job_pendente(client, db):
+    job_id = await enfileirar(client, "importar_servicos", {"servicos": [{"nome": "S", "categoria": "TI"}]})
+
+    response = await client.post(f"/api/jobs/{job_id}/cancelar")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelado"
+
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CANCELADO
+    assert job.tentativas == 0
+    assert await db.jobs_itens.count_documents({}) == 0
+
+
+async def test_cancelar_job_em_execucao(client, db, monkeypatch):
+    servico = await criar_servico(db, valor_fixo=10.0)
+    await criar_propostas(db, servico, 6)
+    await db.servicos.update_one({"id": servico.id}, {"$set": {"valor_fixo": 20.0}})
+    job_id = await enfileirar(client, "reprecificar_propostas")
+
+    reportar_original = server.reportar_progresso_job
+
+    async def reportar_e_cancelar(*args, **kwargs):
+        response = await client.post(f"/api/jobs/{job_id}/cancelar")
+        assert response.json()["status"] == "executando"
+        await reportar_original(*args, **kwargs)
+
+    monkeypatch.setattr(server, "reportar_progresso_job", reportar_e_cancelar)
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CANCELADO
+    assert job.processados == 2
+    assert await valores_totais(db) == [20.0, 20.0, 10.0, 10.0, 10.0, 10.0]
+
+    response = await client.post(f"/api/jobs/{job_id}/cancelar")
+    assert response.status_code == 400
+
+
+# Reprecificação
+
+async def test_reprecificacao_altera_apenas_rascunhos_por_padrao(client, db):
+    servico = await criar_servico(db, valor_fixo=10.0)
+    await criar_propostas(db, servico, 2)
+    await db.propostas.update_one({"id": "p01"}, {"$set": {"status": StatusProposta.ENVIADA}})
+    await db.servicos.update_one({"id": servico.id}, {"$set": {"valor_fixo": 20.0}})
+    job_id = await enfileirar(client, "reprecificar_propostas")
+
+    await server.executar_job(job_id)
+
+    assert await valores_totais(db) == [20.0, 10.0]
+
+
+async def test_reprecificacao_nao_sobrescreve_edicao_concorrente(client, db, monkeypatch):
+    servico = await criar_servico(db, valor_fixo=10.0)
+    await criar_propostas(db, servico, 2)
+    await db.servicos.update_one({"id": servico.id}, {"$set": {"valor_fixo": 20.0}})
+    job_id = await enfileirar(client, "reprecificar_propostas")
+
+    sleep_original = asyncio.sleep
+    editadas = []
+
+    async def sleep_com_edicao(*args, **kwargs):
+        # Usuário edita p01 depois que o lote [p00, p01] foi lido pelo job
+        if not editadas:
+            editadas.append("p01")
+            response = await client.put("/api/propostas/p01", json={"cliente_nome": "Editado"})
+            assert response.status_code == 200
+        await sleep_original(*args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep_com_edicao)
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.resultado == {"atualizadas": 1, "ignoradas": 1}
+    editada = await db.propostas.find_one({"id": "p01"})
+    assert editada["cliente_nome"] == "Editado"
+    assert await valores_totais(db) == [20.0, 10.0]
+
+
+# Retomada após reinício
+
+async def inserir_job_executando(db, atualizado_ha, **campos):
+    job = Job(
+        tipo=TipoJob.REPRECIFICAR_PROPOSTAS,
+        status=StatusJob.EXECUTANDO,
+        dono="outro-processo",
+        updated_at=datetime.utcnow() - atualizado_ha,
+        **campos
+    )
+    await db.jobs.insert_one(job.dict())
+    return job.id
+
+
+async def test_retoma_job_com_lease_expirado_do_checkpoint(client, db):
+    servico = await criar_servico(db, valor_fixo=10.0)
+    await criar_propostas(db, servico, 5)
+    await db.servicos.update_one({"id": servico.id}, {"$set": {"valor_fixo": 20.0}})
+    job_id = await inserir_job_executando(
+        db, timedelta(seconds=server.JOBS_LEASE_SEGUNDOS + 60),
+        checkpoint="p01", processados=2, total=5, tentativas=1,
+        resultado={"atualizadas": 2, "ignoradas": 0}
+    )
+
+    await server.recuperar_jobs()
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.PENDENTE
+    assert job.dono is None
+    assert job_id in server.jobs_enfileirados
+
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CONCLUIDO
+    assert job.processados == 5
+    assert job.tentativas == 2
+    assert job.resultado["atualizadas"] == 5
+    assert await valores_totais(db) == [10.0, 10.0, 20.0, 20.0, 20.0]
+
+
+async def test_retomada_apos_interrupcao_no_meio_do_lote_nao_duplica_contagem(client, db, monkeypatch):
+    servico = await criar_servico(db, valor_fixo=10.0)
+    await criar_propostas(db, servico, 5)
+    await db.servicos.update_one({"id": servico.id}, {"$set": {"valor_fixo": 20.0}})
+    job_id = await enfileirar(client, "reprecificar_propostas")
+
+    sleep_original = asyncio.sleep
+    chamadas = []
+
+    async def sleep_interrompido(*args, **kwargs):
+        # Processo interrompido depois de gravar p02, no meio do lote [p02, p03]
+        chamadas.append(1)
+        if len(chamadas) == 3:
+            raise asyncio.CancelledError()
+        await sleep_original(*args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep_interrompido)
+    with pytest.raises(asyncio.CancelledError):
+        await server.executar_job(job_id)
+    monkeypatch.setattr(asyncio, "sleep", sleep_original)
+
+    job = await buscar_job(db, job_id)
+    assert job.checkpoint == "p01"
+    assert job.resultado["atualizadas"] == 2
+
+    expirado = datetime.utcnow() - timedelta(seconds=server.JOBS_LEASE_SEGUNDOS + 60)
+    await db.jobs.update_one({"id": job_id}, {"$set": {"updated_at": expirado}})
+    await server.recuperar_jobs()
+    await server.executar_job(job_id)
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.CONCLUIDO
+    assert job.resultado == {"atualizadas": 5, "ignoradas": 0}
+    assert await valores_totais(db) == [20.0] * 5
+
+
+async def test_nao_retoma_job_com_lease_valido(client, db):
+    job_id = await inserir_job_executando(db, timedelta(seconds=1), tentativas=1)
+
+    await server.recuperar_jobs()
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.EXECUTANDO
+    assert job.dono == "outro-processo"
+    assert job_id not in server.jobs_enfileirados
+
+
+async def test_cancelamento_nao_renova_lease_expirado(client, db):
+    job_id = await inserir_job_executando(
+        db, timedelta(seconds=server.JOBS_LEASE_SEGUNDOS + 60), tentativas=1
+    )
+
+    response = await client.post(f"/api/jobs/{job_id}/cancelar")
+    assert response.json()["cancelamento_solicitado"] is True
+
+    await server.recuperar_jobs()
+    assert (await buscar_job(db, job_id)).status == StatusJob.PENDENTE
+
+    await server.executar_job(job_id)
+    assert (await buscar_job(db, job_id)).status == StatusJob.CANCELADO
+
+
+async def test_job_falha_apos_maximo_de_tentativas(client, db):
+    job_id = await inserir_job_executando(
+        db, timedelta(seconds=server.JOBS_LEASE_SEGUNDOS + 60), tentativas=server.JOBS_MAX_TENTATIVAS
+    )
+
+    await server.recuperar_jobs()
+
+    job = await buscar_job(db, job_id)
+    assert job.status == StatusJob.FALHOU
+    assert job_id not in server.jobs_enfileirados